@@ -1,15 +1,32 @@
 #!/usr/bin/env python
 
 # Python imports
-import sys
+import argparse
 import re
 from datetime import datetime
-import copy
 
 # Other imports
 import pandas as pd
 from pandas import DataFrame
 
+# Dates are shown as MM/DD/YY and mark the beginning of every ride
+_DATE_RE = re.compile(r'[0-9][0-9]/[0-9][0-9]/[0-9][0-9]')
+_DATE_FORMAT = '%m/%d/%y'
+
+# Texts that identify the values of the columns only present in some rides
+_SPLIT_WITH_TEXT = 'You split this fare with'
+_REQUESTED_BY_TEXT = 'This trip was requested by'
+_CANCELED_TEXT = 'Canceled'
+
+# Tuples of the form:
+# (<text pattern to identify the value>, <column name to add>)
+_OPTIONAL_COLUMNS = [(_SPLIT_WITH_TEXT, 'split_with'),
+                     (_REQUESTED_BY_TEXT, 'requested_by'),
+                     (_CANCELED_TEXT, 'canceled')]
+
+# Currency is everything before the first '$', the fare everything after it
+_CURRENCY_AND_FARE_PATTERN = r'^([^$]*)\$(.*)$'
+
 class UberRiderParser:
     """Parser of Uber Riders webpage.
 
@@ -38,8 +55,10 @@ class UberRiderParser:
     
     Note:
         This module can be executed as follows to take a filename as input and
-        save a .xls file with the information of the file:
+        save a .csv file (separated by ';') with the information of the file:
         $ ./UberRiderParser.py webscrappedData.txt 
+        or to save a .xlsx file instead:
+        $ ./UberRiderParser.py --excel webscrappedData.txt
 
         The fare is taken as shown in the main table in the webpage, which does
         not consider split fare. 
@@ -67,56 +86,44 @@ class UberRiderParser:
                         'payment']
 
     def _split_by_pattern(self, string, pattern):
-        # Store the begin positions of the segments
-        segment_begins = [match.span()[0] for match in re.finditer(pattern, 
-                                                                   string)]
-        # Add a dummy "begin" that will serve as end limit for the last elem
-        segment_begins.append(len(string))
-        
-        # Define the begin and end for each segment
-        segment_limits = [(segment_begins[i], segment_begins[i+1]) 
-                          for i in range(0, len(segment_begins)-1)]
-
-        # Do the actual split
-        lines = [string[pos[0]:pos[1]] for pos in segment_limits]
+        # Each segment goes from the start of a match to the start of the next
+        # one (or the end of the string for the last match)
+        lines = []
+        prev_start = None
+        for match in pattern.finditer(string):
+            start = match.start()
+            if prev_start is not None:
+                lines.append(string[prev_start:start])
+            prev_start = start
+        if prev_start is not None:
+            lines.append(string[prev_start:])
         return lines
     
-    def _handle_optional_column(self, line, text_pattern, col_name):
-        """Looks for text_pattern in each of the elements (columns) of the line
-        and if found, moves it to the corresponding position of the column 
-        col_name"""
-        # Search for the text in each of the elements of the line
-        search_results = [col.find(text_pattern) for col in line]
-        bool_found_here = [True if x != -1 else False for x in search_results]
-        if sum(bool_found_here) != 1:
-            # Text not present in any of the elements of the line, add a new
-            # empty column
-            text_to_insert = ''
-        else:
-            # Text is present
-            index_element_to_move = bool_found_here.index(True)
-            text_to_insert = copy.copy(line[index_element_to_move])
-
-            # Remove the element that will be moved into a new column
-            del(line[index_element_to_move])
-
-        # Add the value
-        column_index = self.columns.index(col_name)
-        line[column_index] = text_to_insert
-
-        # Return the modified line
-        return line
-
-    def _read_file_as_list_of_lists(self):
+    def _find_optional_columns(self, line):
+        """Looks for the text of each optional column in the elements (columns)
+        of the line, in a single pass over the line.
+
+        Returns:
+            list: for each element of _OPTIONAL_COLUMNS, the position in line
+                of the element that contains its text, or None if the text is
+                not present in exactly one element.
+        """
+        found_at = [None]*len(_OPTIONAL_COLUMNS)
+        for i, col in enumerate(line):
+            for j, (text_pattern, _) in enumerate(_OPTIONAL_COLUMNS):
+                if text_pattern in col:
+                    # -1 marks a text present in more than one element
+                    found_at[j] = i if found_at[j] is None else -1
+                    break
+        return [None if i == -1 else i for i in found_at]
+
+    def _read_file_as_columns(self):
         # The webpage displays some information in multiple lines. Combine them 
         # into a string then split them
-        with open(self.filename) as f:
-            lines = f.readlines()
-        
         # Strip by the left, not by right because it would mess with multiline
         # data
-        lines = [line.lstrip() for line in lines]
-        file_as_string = ''.join(lines)
+        with open(self.filename) as f:
+            file_as_string = ''.join(line.lstrip() for line in f)
         
         # Case where info is shown in multiple rows
         file_as_string = file_as_string.replace('\n', '\t')
@@ -125,29 +132,36 @@ class UberRiderParser:
         file_as_string = file_as_string.replace('  ', ' ')
 
         # Split the string to get individual lines
-        uber_date_pattern = r'[0-9][0-9]/[0-9][0-9]/[0-9][0-9]'
-        lines = self._split_by_pattern(file_as_string, uber_date_pattern)
+        lines = self._split_by_pattern(file_as_string, _DATE_RE)
         
         # Split each of the individual lines
         # Given that the webpage displays nothing for some empty values, using
         # regex would be a mess, so the tabs will be used as column indicators
-        lines = [line.strip() for line in lines]
-        lines = [line.split('\t') for line in lines]
+        lines = [line.strip().split('\t') for line in lines]
         
         # Handle the columns that are only present in some lines and are not
-        # properly separated
-        # optional_cols has tuples of the form:
-        # (<text pattern to identify the value>, <column name to add>)
-        optional_cols =  [('You split this fare with', 'split_with'),
-                          ('This trip was requested by', 'requested_by'),
-                          ('Canceled', 'canceled')]
-        self.columns += [elem[1] for elem in optional_cols]
-        lines = [line + ['']*len(optional_cols) for line in lines]
-        for pattern, col_name in optional_cols:
-            for line in lines:
-                line = self._handle_optional_column(line, pattern, col_name)
-
-        return lines
+        # properly separated: their values are moved out of the line and the
+        # remaining values are the base columns
+        num_base_columns = len(self.columns)
+        self.columns += [elem[1] for elem in _OPTIONAL_COLUMNS]
+
+        # Store the values column by column
+        column_values = [[None]*len(lines) for _ in self.columns]
+        base_values = column_values[:num_base_columns]
+        optional_values = column_values[num_base_columns:]
+        for row, line in enumerate(lines):
+            found_at = self._find_optional_columns(line)
+            for values, i in zip(optional_values, found_at):
+                values[row] = line[i] if i is not None else ''
+            base_line = [col for i, col in enumerate(line) if i not in found_at]
+            if len(base_line) != num_base_columns:
+                raise ValueError('Line {} has {} columns, expected {}: {}'
+                                 .format(row, len(base_line),
+                                         num_base_columns, line))
+            for values, value in zip(base_values, base_line):
+                values[row] = value
+
+        return dict(zip(self.columns, column_values))
 
     def as_df(self):
         """Parses the file point by self.filename into a pandas DataFrame.
@@ -156,12 +170,13 @@ class UberRiderParser:
             DataFrame: pandas DataFrame with the information contained in
                 self.filename.
         """        
-        table = self._read_file_as_list_of_lists()
-        df = DataFrame(table)
-        df.columns = self.columns
+        table = self._read_file_as_columns()
+        df = DataFrame(table, columns=self.columns)
 
         # Fix date format
-        df['date'] = pd.to_datetime(df['date'],infer_datetime_format=True)
+        # Only whole lines are stripped, date cells may keep stray whitespace
+        df['date'] = pd.to_datetime(df['date'].str.strip(),
+                                    format=_DATE_FORMAT, cache=True)
 
         # Split fare column in currency and fare
         # This fare is total (as displayed on Uber Riders webpage summmary) and
@@ -169,42 +184,54 @@ class UberRiderParser:
         # to know the actual paid fare without clicking on View Details for
         # each ride, doing that would require a more complicated logic and web
         # parsing logic)
-        df['currency'], df['fare'] = \
-        zip(*df['fare'].apply(lambda x: x.split('$', 1)
-                              if "$" in x else [None, 0.0]))
-        df['currency'] = df['currency'].apply(lambda x:
-        x.replace(' ', '') if x is not None else None)
+        # Fares without '$' are 0
+        currency_and_fare = df['fare'].str.extract(_CURRENCY_AND_FARE_PATTERN)
+        df['currency'] = currency_and_fare[0].str.replace(' ', '', regex=False)
+        df['fare'] = pd.to_numeric(currency_and_fare[1]).fillna(0.0)
         
         # Make column canceled boolean
-        df['canceled'] = df['canceled'].apply(lambda x: True if x == 'Canceled'
-                                             else False)
+        df['canceled'] = df['canceled'].eq(_CANCELED_TEXT)
+
         # Clean split_with column
-        df['split_with'] = df['split_with'].apply(lambda x:
-        x.replace('You split this fare with ', '') if 'split this' in x 
-        else None)
+        is_split = df['split_with'].str.contains(_SPLIT_WITH_TEXT,
+                                                 regex=False)
+        df['split_with'] = df['split_with'].str.replace(
+            _SPLIT_WITH_TEXT + ' ', '', regex=False).where(is_split, None)
 
         # Clean requested_by column
-        df['requested_by'] = df['requested_by'].apply(lambda x:
-        x.replace('This trip was requested by ', '') if 'requested by' in x 
-        else None)
+        is_requested = df['requested_by'].str.contains(_REQUESTED_BY_TEXT,
+                                                       regex=False)
+        df['requested_by'] = df['requested_by'].str.replace(
+            _REQUESTED_BY_TEXT + ' ', '', regex=False).where(is_requested,
+                                                             None)
 
         # Column selection
         df = df[['date', 'driver', 'ride_type', 'city', 'payment', 
                  'split_with', 'requested_by', 'canceled', 'currency', 
                  'fare', ]]
-        
-        # datatypes
-        df = df.infer_objects()
-        df['fare'] = pd.to_numeric(df['fare'])
+
+        # Columns with few distinct values are stored as categories
+        df = df.astype({col: 'category'
+                        for col in ['ride_type', 'city', 'payment',
+                                    'currency']})
         return df
 
 if __name__ == '__main__':
-    input_filename = sys.argv[1]
-    parser = UberRiderParser(input_filename)
+    arg_parser = argparse.ArgumentParser(
+        description='Parse webscrapped Uber Riders rides information')
+    arg_parser.add_argument('filename',
+                            help='file with the webscrapped information')
+    arg_parser.add_argument('--excel', action='store_true',
+                            help='save a .xlsx file instead of a .csv file')
+    args = arg_parser.parse_args()
+    parser = UberRiderParser(args.filename)
     df = parser.as_df()
     output_filename = datetime.today().isoformat().replace(':', '-')[0:16]
-    output_filename += '.xls'
-    writer = pd.ExcelWriter(output_filename)
-    df.to_excel(writer, 'sheet1')
-    writer.save()
+    if args.excel:
+        output_filename += '.xlsx'
+        with pd.ExcelWriter(output_filename, engine='xlsxwriter') as writer:
+            df.to_excel(writer, sheet_name='sheet1')
+    else:
+        output_filename += '.csv'
+        df.to_csv(output_filename, sep=parser.separator)
     print("Saved ", output_filename)